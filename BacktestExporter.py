@@ -0,0 +1,130 @@
+import os
+import pandas as pd
+
+
+class BacktestExporter:
+    """
+    Exports the results of one or more calculated FixedWeightBacktester
+    objects to an Excel workbook, or to a directory of Parquet or csv
+    files.  The statistics, annual performance and market corrections of
+    all the backtests are stacked into single tables with a backtest
+    column, and the time series of each backtest is written separately.
+
+    Attributes
+    ----------
+    backtests: dict[str, FixedWeightBacktester]
+        Calculated backtesters keyed by the name used in the export.
+
+    statistics: pd.DataFrame
+        The statistics of every backtest.
+
+    annual_performance: pd.DataFrame
+        The annual performance of every backtest.
+
+    market_corrections: pd.DataFrame
+        The portfolio drawdowns during the market corrections of every
+        backtest that has them.
+    """
+    # rows converted at a time when writing a sheet to Excel
+    excel_chunksize = 10_000
+
+    def __init__(self, backtests: dict):
+        """
+        Parameters:
+        -----------
+        backtests: dict[str, FixedWeightBacktester]
+            Backtesters keyed by the name used in the export.  The
+            calc_portfolio_statistics() or calc_streaming_statistics()
+            method must already have been called on each of them.
+        """
+        for name in backtests:
+            if len("returns_" + name) > 31 or set(name) & set("[]:*?/\\"):
+                raise ValueError(f"backtest name not usable in export: {name}")
+        self.backtests = backtests
+
+        self.statistics = self._stack(
+            lambda x: x.statistics.reset_index()
+        )
+        self.annual_performance = self._stack(
+            lambda x: x.annual_performance
+        )
+        self.market_corrections = self._stack(
+            lambda x: x.market_corrections
+            if getattr(x, "market_corrections", None) is not None
+            else None
+        )
+
+    def _stack(self, get_table) -> pd.DataFrame:
+        """
+        Stacks a table of every backtest with a leading backtest column.
+        """
+        lst_tables = []
+        for name, backtest in self.backtests.items():
+            df = get_table(backtest)
+            if df is None:
+                continue
+            df = df.copy()
+            df.insert(0, "backtest", name)
+            lst_tables.append(df)
+        if not lst_tables:
+            return pd.DataFrame({"backtest": []})
+        return pd.concat(lst_tables, ignore_index=True)
+
+    def _tables(self):
+        """
+        Yields the name and contents of every table in the export.
+        """
+        yield "statistics", self.statistics
+        yield "annual_performance", self.annual_performance
+        yield "market_corrections", self.market_corrections
+        for name, backtest in self.backtests.items():
+            if getattr(backtest, "returns", None) is not None:
+                yield "returns_" + name, backtest.returns
+
+    def to_excel(self, path: str) -> None:
+        """
+        Writes every table to its own sheet of an xlsx workbook.  Rows
+        are streamed to disk with the constant memory mode of xlsxwriter,
+        so the wide time series are not held as cells in memory.
+        """
+        import xlsxwriter
+
+        workbook = xlsxwriter.Workbook(path, {
+            "constant_memory": True,
+            "nan_inf_to_errors": True,
+            "default_date_format": "yyyy-mm-dd",
+        })
+        try:
+            for sheet_name, df in self._tables():
+                worksheet = workbook.add_worksheet(sheet_name)
+                worksheet.write_row(0, 0, [str(x) for x in df.columns])
+                # converting a bounded block of rows at a time so that the
+                # wide time series is never copied into Python objects whole
+                chunksize = self.excel_chunksize
+                for ix_start in range(0, len(df), chunksize):
+                    df_chunk = df.iloc[ix_start:ix_start + chunksize]
+                    df_chunk = \
+                        df_chunk.astype(object).where(df_chunk.notna(), None)
+                    for ix_row, row in enumerate(
+                            df_chunk.itertuples(index=False, name=None),
+                            ix_start + 1):
+                        worksheet.write_row(ix_row, 0, row)
+        finally:
+            workbook.close()
+
+    def to_parquet(self, directory: str) -> None:
+        """
+        Writes every table to a Parquet file in directory.
+        """
+        os.makedirs(directory, exist_ok=True)
+        for name, df in self._tables():
+            df.to_parquet(os.path.join(directory, name + ".parquet"),
+                          index=False)
+
+    def to_csv(self, directory: str) -> None:
+        """
+        Writes every table to a csv file in directory.
+        """
+        os.makedirs(directory, exist_ok=True)
+        for name, df in self._tables():
+            df.to_csv(os.path.join(directory, name + ".csv"), index=False)
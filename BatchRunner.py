@@ -0,0 +1,317 @@
+"""
+Command-line batch runner for FixedWeightBacktester.
+
+Runs every combination of the portfolios, windows and rebalance
+frequencies in a JSON or YAML spec file in parallel and writes the
+combined statistics.  An example spec:
+
+    {
+        "prices": {
+            "path": "data/bufr_bufd_mquslblr.xlsx",
+            "rename": {"mquslblr": "buffer_020"}
+        },
+        "portfolios": {
+            "spy60_agg40": {"spy": 0.6, "agg": 0.4}
+        },
+        "windows": [{"start": "2007-04-11", "end": "2024-12-31"}],
+        "frequencies": ["monthly", "quarterly", null],
+        "corrections": {"assets": ["spy"], "thresholds": [-0.05, -0.1]},
+        "output": "results"
+    }
+
+Finished jobs are appended to a checkpoint file as they complete, so an
+interrupted run picks up where it stopped when it is started again.  A
+job that raises is recorded as failed, listed in failures.csv and makes
+the runner exit with status 1, without stopping the other jobs.  Failed
+jobs are run again when the runner is started again.
+
+Usage:
+    python BatchRunner.py spec.json --processes 8
+"""
+import argparse
+import datetime
+import hashlib
+import itertools
+import json
+import multiprocessing
+import os
+import sys
+import traceback
+import numpy as np
+import pandas as pd
+from FixedWieightBacktester import FixedWeightBacktester
+from MarketCorrections import MultiMarketCorrections
+from Utilities import calc_statistics
+
+
+# columns that identify the job of each output row
+JOB_COLUMNS = ["job_id", "portfolio", "date_start", "date_end", "frequency"]
+
+# prices and corrections shared by every job of a worker process
+_worker_prices = None
+_worker_corrections = None
+
+
+def load_spec(path: str) -> dict:
+    """
+    Reads a JSON or YAML spec file.
+    """
+    with open(path) as f:
+        if path.endswith((".yaml", ".yml")):
+            import yaml
+            return yaml.safe_load(f)
+        return json.load(f)
+
+
+def load_prices(path: str,
+                sheets: list[str] = None,
+                rename: dict[str, str] = None) -> pd.DataFrame:
+    """
+    Loads prices with a date column and a column for each asset from an
+    xlsx workbook with one sheet per asset, or from a csv or parquet file.
+
+    Parameters:
+    ---
+    path: str
+        Location of the prices.
+
+    sheets: list[str]
+        Sheets of the workbook to load.  Every sheet with a single price
+        column is loaded when this is not given.
+
+    rename: dict[str, str]
+        Asset columns to rename.
+    ---
+    """
+    if path.endswith(".parquet"):
+        df_prices = pd.read_parquet(path)
+    elif path.endswith(".csv"):
+        df_prices = pd.read_csv(path, parse_dates=["date"])
+    else:
+        dfs_sheet = pd.read_excel(path, sheet_name=sheets)
+        if sheets is None:
+            dfs_sheet = {
+                name: df for name, df in dfs_sheet.items()
+                if len(df.columns) == 2 and "date" in df.columns
+            }
+        df_prices = None
+        for df in dfs_sheet.values():
+            if df_prices is None:
+                df_prices = df
+            else:
+                df_prices = df_prices.merge(df, how="outer", on="date")
+    if rename is not None:
+        df_prices = df_prices.rename(columns=rename)
+
+    return df_prices.sort_values("date").reset_index(drop=True)
+
+
+def make_jobs(spec: dict) -> list[dict]:
+    """
+    Expands the portfolios, windows and rebalance frequencies of a spec
+    into one job per combination.  The job id ends with a hash of the
+    weights and the prices and corrections settings, so a checkpoint
+    result is only reused for the exact job that produced it.
+    """
+    settings = {
+        "prices": spec["prices"],
+        "corrections": spec.get("corrections"),
+    }
+    jobs = []
+    combinations = itertools.product(
+        spec["portfolios"].items(),
+        spec["windows"],
+        spec.get("frequencies", [None]),
+    )
+    for (name, weights), window, frequency in combinations:
+        fingerprint = hashlib.sha1(json.dumps(
+            dict(settings, weights=weights), sort_keys=True, default=str
+        ).encode()).hexdigest()[:12]
+        jobs.append({
+            "job_id": (f"{name}|{window['start']}|{window['end']}|"
+                       f"{frequency}|{fingerprint}"),
+            "portfolio": name,
+            "weights": weights,
+            "date_start": str(window["start"]),
+            "date_end": str(window["end"]),
+            "frequency": frequency,
+        })
+
+    return jobs
+
+
+def _init_worker(prices: pd.DataFrame, corrections: pd.DataFrame) -> None:
+    global _worker_prices, _worker_corrections
+    _worker_prices = prices
+    _worker_corrections = corrections
+
+
+def _run_job(job: dict) -> dict:
+    """
+    Runs one job, returning a failed record with the error instead of
+    raising so that one bad job does not stop the sweep.
+    """
+    try:
+        return _run_backtest(job)
+    except Exception as e:
+        return {
+            "job_id": job["job_id"],
+            "error": "".join(traceback.format_exception_only(e)).strip(),
+            "statistics": [],
+            "market_corrections": [],
+        }
+
+
+def _run_backtest(job: dict) -> dict:
+    """
+    Runs one backtest and returns its statistics and correction drawdowns
+    as records that can be written to the checkpoint.
+    """
+    assets = list(job["weights"])
+    prices = _worker_prices[["date"] + assets].dropna()
+    drb = FixedWeightBacktester(
+        job["weights"],
+        prices,
+        datetime.date.fromisoformat(job["date_start"]),
+        datetime.date.fromisoformat(job["date_end"]),
+        job["frequency"],
+        _worker_corrections,
+    )
+    drb.calc_daily_returns()
+    drb.calc_portfolio_statistics()
+
+    keys = {x: job[x] for x in JOB_COLUMNS}
+    df_statistics = drb.statistics.reset_index()
+    df_corrections = pd.DataFrame()
+    if drb.market_corrections is not None:
+        drb.calc_period_drawdowns()
+        df_corrections = drb.market_corrections
+    for df in [df_statistics, df_corrections]:
+        for ix, (key, value) in enumerate(keys.items()):
+            df.insert(ix, key, value)
+
+    return {
+        "job_id": job["job_id"],
+        "statistics": df_statistics.to_dict("records"),
+        "market_corrections": df_corrections.to_dict("records"),
+    }
+
+
+def read_checkpoint(path: str) -> list[dict]:
+    """
+    Reads the results of the finished jobs from a checkpoint file.  A
+    partly written last line from an interrupted run is cut off the file
+    in place, so that the results before it are never rewritten.
+    """
+    results = []
+    if not os.path.exists(path):
+        return results
+    size_complete = 0
+    with open(path, "rb") as f:
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            try:
+                results.append(json.loads(line))
+            except json.JSONDecodeError:
+                break
+            size_complete += len(line)
+    if size_complete < os.path.getsize(path):
+        os.truncate(path, size_complete)
+
+    return results
+
+
+def run(spec: dict, processes: int = None, chunksize: int = 16) -> int:
+    """
+    Runs every job of a spec that is not already in the checkpoint and
+    writes the combined statistics and correction drawdowns to the
+    output directory.  Jobs that raised are written to failures.csv and
+    their number is returned.
+    """
+    output = spec.get("output", "results")
+    os.makedirs(output, exist_ok=True)
+    path_checkpoint = \
+        spec.get("checkpoint", os.path.join(output, "checkpoint.jsonl"))
+
+    # loading prices and finding corrections once for all jobs
+    spec_prices = spec["prices"]
+    prices = load_prices(
+        spec_prices["path"],
+        spec_prices.get("sheets"),
+        spec_prices.get("rename"),
+    )
+    corrections = None
+    if "corrections" in spec:
+        corrections = MultiMarketCorrections(
+            prices,
+            spec["corrections"]["thresholds"],
+            spec["corrections"].get("assets"),
+        ).corrections
+
+    # skipping jobs finished by an earlier run, and ignoring results of
+    # jobs that are no longer in the spec.  Jobs that failed are run again.
+    jobs = make_jobs(spec)
+    job_ids = {x["job_id"] for x in jobs}
+    results = [x for x in read_checkpoint(path_checkpoint)
+               if x["job_id"] in job_ids and "error" not in x]
+    jobs_done = {x["job_id"] for x in results}
+    jobs = [x for x in jobs if x["job_id"] not in jobs_done]
+
+    with open(path_checkpoint, "a") as f, multiprocessing.Pool(
+            processes, _init_worker, (prices, corrections)) as pool:
+        for result in pool.imap_unordered(_run_job, jobs, chunksize):
+            f.write(json.dumps(result, default=str) + "\n")
+            f.flush()
+            results.append(result)
+
+    # writing the combined results, with a header even when no job
+    # succeeded
+    columns_statistics = JOB_COLUMNS + ["asset"] + list(
+        calc_statistics(np.zeros((2, 1)), np.ones((2, 1)), ["x"]).columns
+    )
+    df_statistics = pd.DataFrame(
+        [x for result in results for x in result["statistics"]],
+        columns=columns_statistics,
+    )
+    df_statistics.to_csv(os.path.join(output, "statistics.csv"), index=False)
+    if corrections is not None:
+        columns_corrections = \
+            JOB_COLUMNS + list(corrections.columns) + ["drawdown_portfolio"]
+        df_corrections = pd.DataFrame(
+            [x for result in results for x in result["market_corrections"]],
+            columns=columns_corrections,
+        )
+        df_corrections.to_csv(
+            os.path.join(output, "market_corrections.csv"), index=False
+        )
+    df_failures = pd.DataFrame(
+        [{"job_id": x["job_id"], "error": x["error"]}
+         for x in results if "error" in x],
+        columns=["job_id", "error"],
+    )
+    df_failures.to_csv(os.path.join(output, "failures.csv"), index=False)
+
+    return len(df_failures)
+
+
+def main(argv: list[str] = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Runs the FixedWeightBacktester jobs of a spec file."
+    )
+    parser.add_argument("spec", help="JSON or YAML spec file")
+    parser.add_argument("--processes", type=int, default=None,
+                        help="worker processes, defaults to the cpu count")
+    parser.add_argument("--chunksize", type=int, default=16,
+                        help="jobs sent to a worker at a time")
+    args = parser.parse_args(argv)
+
+    n_failures = run(load_spec(args.spec), args.processes, args.chunksize)
+    if n_failures > 0:
+        print(f"{n_failures} jobs failed, see failures.csv in the output "
+              "directory", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,8 @@
 import numpy as np
 import pandas as pd
 import datetime
-from Utilities import period_max_drawdown
+from Utilities import calc_statistics, period_keys, RunningMoments
+from Utilities import statistics_from_moments
 
 
 class FixedWeightBacktester:
@@ -22,8 +23,9 @@ class FixedWeightBacktester:
         Contains the start, bottom, end date of prices corrections of a
         particular asset.  Typically some kind of broad market index like
         SPY will be used.  This is usually the result of the MarketCorrections
-        class.  It is modified by the calc_period_drawdown() method to contain
-        the drawdowns of the weighted portfolio during the drawdown periods.
+        or MultiMarketCorrections class.  It is modified by the
+        calc_period_drawdown() method to contain the drawdowns of the
+        weighted portfolio during the drawdown periods.
 
     date_start: datetime.date
         The start date of the backtest.
@@ -43,29 +45,12 @@ class FixedWeightBacktester:
         The prices, daily returns, equity curve, drawdowns of the assets
         and the weighted portfolio that is being backtested.
 
-    cumulative_returns: dict[str, float]
-        The cumulative returns for each of the component assets and
-        the weighted portfolio.
-
-    annual_returns: dict[str, float]
-        The annualized returns for each of the component assets and
-        the weighted portfolio.
-
-    volatility: dict[str, float]
-        The annualized volatility for each of the component assets and
-        the weighted portfolio.
-
-    sharpe_ratio: dict[str, float]
-        The annualized sharpe-ratio for each of the component assets and
-        the weighted portfolio.
-
-    sharpe_ratio: dict[str, float]
-        The annualized sharpe-ratio for each of the component assets and
-        the weighted portfolio.
-
-    drawdown_max: dict[str, float]
-        The maximum for each of the component assets and
-        the weighted portfolio.
+    statistics: pd.DataFrame
+        The cumulative return, annualized return, volatility, sharpe-ratio,
+        sortino-ratio, calmar-ratio, skew, kurtosis, maximum drawdown,
+        value-at-risk and conditional value-at-risk for each of the
+        component assets and the weighted portfolio.  Indexed by asset,
+        with the weighted portfolio under "portfolio".
 
     annual_performance: pd.DataFrame
         The performance of the weighted portfolio for each calendar
@@ -90,9 +75,9 @@ class FixedWeightBacktester:
             Contains the start, bottom, end date of prices corrections of a
             particular asset.  Typically some kind of broad
             market index like SPY will be used.  This is usually the result
-            of the MarketCorrections class.  It is modified by the
-            calc_period_drawdown() method to contain the drawdowns of the
-            weighted portfolio during the drawdown periods.
+            of the MarketCorrections or MultiMarketCorrections class.  It is
+            modified by the calc_period_drawdown() method to contain the
+            drawdowns of the weighted portfolio during the drawdown periods.
 
         date_start: datetime.date
             The start date of the backtest.
@@ -338,56 +323,13 @@ class FixedWeightBacktester:
         Calculates the portfolio statistics and annual performance of the
         component assets and the weighted portfolio being backtested.
         """
-        # cumulative return
-        self.cumulative_return = {}
-        for ix_asset in self.assets:
-            equity_col_name = "equity_" + ix_asset
-            self.cumulative_return[ix_asset] = \
-                (self.returns[equity_col_name].iloc[-1] - 1)
-        self.cumulative_return["portfolio"] = \
-            self.returns["equity_portfolio"].iloc[-1] - 1
-
-        # annual return
-        self.annual_return = {}
-        for ix_asset in self.assets:
-            equity_col_name = "equity_" + ix_asset
-            self.annual_return[ix_asset] = (
-                self.returns[equity_col_name].iloc[-1]
-                ** (252/(len(self.returns) - 1)) - 1
-            )
-        self.annual_return["portfolio"] = \
-            self.returns["equity_portfolio"].iloc[-1] \
-            ** (252/(len(self.returns) - 1)) - 1
-
-        # volatility
-        self.volatility = {}
-        for ix_asset in self.assets:
-            ret_col_name = "ret_" + ix_asset
-            self.volatility[ix_asset] = \
-                self.returns[ret_col_name][1:].std() * np.sqrt(252)
-        self.volatility["portfolio"] = \
-            self.returns["ret_portfolio"][1:].std() * np.sqrt(252)
-
-        # sharpe-ratio
-        self.sharpe_ratio = {}
-        for ix_asset in self.assets:
-            ret_col_name = "ret_" + ix_asset
-            self.sharpe_ratio[ix_asset] = (
-                self.returns[ret_col_name][1:].mean() /
-                self.returns[ret_col_name][1:].std()
-            ) * np.sqrt(252)
-        self.sharpe_ratio["portfolio"] = (
-            self.returns["ret_portfolio"][1:].mean() /
-            self.returns["ret_portfolio"][1:].std()
-        ) * np.sqrt(252)
-
-        # maximum drawdown
-        self.drawdown_max = {}
-        for ix_asset in self.assets:
-            drawdown_col_name = "drawdown_" + ix_asset
-            self.drawdown_max[ix_asset] = self.returns[drawdown_col_name].min()
-        self.drawdown_max["portfolio"] = \
-            self.returns["drawdown_portfolio"].min()
+        # all statistics for the assets and portfolio in one pass
+        names = self.assets + ["portfolio"]
+        self.statistics = calc_statistics(
+            self.returns[["ret_" + x for x in names]].values,
+            self.returns[["equity_" + x for x in names]].values,
+            names,
+        )
 
         # annual performance
         df_portfolio = self.returns[["date", "ret_portfolio"]].copy()
@@ -403,18 +345,183 @@ class FixedWeightBacktester:
     def calc_period_drawdowns(self) -> None:
         """
         Calculates the performance of the weighted portfolio during
-        the drawdown periods in self.market_corrections
+        the drawdown periods in self.market_corrections.  The periods may
+        come from a single MarketCorrections or from the long-form table
+        of MultiMarketCorrections; all of them are located in the equity
+        curve with one batched lookup, and periods shared between assets
+        or thresholds are only calculated once.
         """
-        drawdowns_portfolio = []
-        for ix in self.market_corrections.index:
-            dt_start = self.market_corrections.at[ix, "start"]
-            dt_end = self.market_corrections.at[ix, "end"]
-            drawdown_portfolio = \
-                period_max_drawdown(
-                    asset="portfolio",
-                    date_start=dt_start,
-                    date_end=dt_end,
-                    df_ret=self.returns,
-                )
-            drawdowns_portfolio.append(drawdown_portfolio)
-        self.market_corrections["drawdown_portfolio"] = drawdowns_portfolio
+        dates = pd.to_datetime(self.returns["date"]).values
+        equity = self.returns["equity_portfolio"].values
+
+        # locating the start and end of every period in the equity curve
+        periods = (
+            self.market_corrections[["start", "end"]]
+            .apply(pd.to_datetime)
+            .drop_duplicates()
+        )
+        ixs_start = np.searchsorted(dates, periods["start"].values, "left")
+        ixs_end = np.searchsorted(dates, periods["end"].values, "right")
+
+        drawdowns = []
+        for ix_start, ix_end in zip(ixs_start, ixs_end):
+            equity_period = equity[ix_start:ix_end]
+            if len(equity_period) == 0:
+                drawdowns.append(np.nan)
+                continue
+            drawdowns.append(np.min(
+                equity_period / np.maximum.accumulate(equity_period) - 1
+            ))
+        periods["drawdown_portfolio"] = drawdowns
+
+        self.market_corrections["drawdown_portfolio"] = (
+            self.market_corrections[["start", "end"]]
+            .apply(pd.to_datetime)
+            .merge(periods, how="left", on=["start", "end"])
+            ["drawdown_portfolio"].values
+        )
+
+    def calc_streaming_statistics(self,
+                                  source,
+                                  chunksize: int = 100_000,
+                                  periods_per_year: int = 252) -> None:
+        """
+        Calculates the portfolio statistics and annual performance from
+        prices that are read in date-ordered chunks, for histories that
+        are too long to hold in memory such as minute bars.  The last
+        prices, holdings, running peaks and running moments are carried
+        from one chunk to the next, so memory stays bounded by the chunk
+        size.  self.returns is not populated.
+
+        Rebalancing happens on the last row of each period, where a
+        "daily" period is a single row, as in calc_portfolio_statistics().
+        The value-at-risk and conditional value-at-risk need the full
+        return history and are left as NaN.
+
+        source: str or Iterable[pd.DataFrame]
+            Path to a csv or parquet file of prices, or an iterable of
+            DataFrames with a date column and a column for each asset.
+
+        chunksize: int
+            Number of rows read at a time when source is a path.
+
+        periods_per_year: int
+            Number of price rows in a year, used to annualize.
+        """
+        if isinstance(source, str):
+            source = _read_price_chunks(source, self.assets, chunksize)
+        date_start = pd.Timestamp(self.date_start)
+        date_end = pd.Timestamp(self.date_end)
+        weights = np.array(self.weights, dtype=float)
+        names = self.assets + ["portfolio"]
+
+        # state carried forward between chunks
+        first_prices = None
+        last_prices = None
+        last_value = 1.0
+        last_key = None
+        holdings = None
+        peak = np.zeros(len(names))
+        drawdown_max = np.zeros(len(names))
+        moments = RunningMoments(len(names))
+        annual_growth = {}
+
+        for df_chunk in source:
+            dates = pd.to_datetime(df_chunk["date"])
+            mask = ((date_start <= dates) & (dates <= date_end)).values
+            if not mask.any():
+                continue
+            dates = dates[mask].reset_index(drop=True)
+            prices = df_chunk[self.assets].values[mask].astype(float)
+
+            # a new period starting on a row means the prior row rebalanced
+            if self.frequency_rebalance is None:
+                new_period = np.ones(len(prices), dtype=bool)
+            else:
+                keys = period_keys(dates, self.frequency_rebalance)
+                keys_prior = np.concatenate([
+                    keys[:1] if last_key is None else [last_key], keys[:-1]
+                ])
+                new_period = keys != keys_prior
+                last_key = keys[-1]
+
+            is_first_chunk = first_prices is None
+            if is_first_chunk:
+                first_prices = prices[0]
+                last_prices = prices[0]
+                holdings = last_value * weights / last_prices
+                new_period[0] = False
+
+            # valuing the portfolio one holding period at a time
+            prices_prior = np.vstack([last_prices, prices[:-1]])
+            ret_assets = prices / prices_prior - 1
+            if new_period[int(is_first_chunk):].all():
+                ret_portfolio = ret_assets @ weights
+                values = last_value * np.cumprod(1 + ret_portfolio)
+                value_prior = last_value if len(values) == 1 else values[-2]
+                holdings = value_prior * weights / prices_prior[-1]
+            else:
+                values = np.empty(len(prices))
+                edges = np.concatenate([
+                    [0], np.flatnonzero(new_period[1:]) + 1, [len(prices)]
+                ])
+                value_prior = last_value
+                for ix_start, ix_end in zip(edges[:-1], edges[1:]):
+                    if new_period[ix_start]:
+                        holdings = \
+                            value_prior * weights / prices_prior[ix_start]
+                    values[ix_start:ix_end] = \
+                        prices[ix_start:ix_end] @ holdings
+                    value_prior = values[ix_end - 1]
+                values_prior = np.concatenate([[last_value], values[:-1]])
+                ret_portfolio = values / values_prior - 1
+
+            # running peaks and maximum drawdowns of the equity curves
+            equity = np.column_stack([prices / first_prices, values])
+            peaks = np.maximum(peak, np.maximum.accumulate(equity, axis=0))
+            drawdown_max = np.minimum(
+                drawdown_max, (equity / peaks - 1).min(axis=0)
+            )
+            peak = peaks[-1]
+
+            # running moments, skipping the start of the backtest
+            returns = np.column_stack([ret_assets, ret_portfolio])
+            moments.update(returns[int(is_first_chunk):])
+
+            # annual performance of the portfolio
+            growth = pd.Series(1 + ret_portfolio).groupby(
+                dates.dt.year.values).prod()
+            for year, value in growth.items():
+                annual_growth[year] = annual_growth.get(year, 1.0) * value
+
+            last_prices = prices[-1]
+            last_value = values[-1]
+
+        if first_prices is None:
+            raise ValueError("no prices in backtest window")
+        equity_last = np.append(last_prices / first_prices, last_value)
+        self.statistics = statistics_from_moments(
+            moments.n, moments.mean, moments.m2, moments.m3, moments.m4,
+            moments.downside, equity_last, drawdown_max,
+            np.full(len(names), np.nan), np.full(len(names), np.nan),
+            names, periods_per_year,
+        )
+        self.annual_performance = pd.DataFrame({
+            "year": list(annual_growth.keys()),
+            "ret_portfolio": [x - 1 for x in annual_growth.values()],
+        })
+
+
+def _read_price_chunks(path: str, assets: list[str], chunksize: int):
+    """
+    Yields date-ordered DataFrames of prices from a csv or parquet file.
+    """
+    columns = ["date"] + assets
+    if path.endswith(".parquet"):
+        import pyarrow.parquet as pq
+        parquet_file = pq.ParquetFile(path)
+        for batch in parquet_file.iter_batches(chunksize, columns=columns):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, usecols=columns, chunksize=chunksize,
+                               parse_dates=["date"])
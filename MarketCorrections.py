@@ -1,6 +1,6 @@
 import pandas as pd
-import yfinance as yf
 import datetime
+from Utilities import drawdown_episodes
 
 
 class MarketCorrections:
@@ -29,7 +29,7 @@ class MarketCorrections:
         All drawdown periods that exceed the threshold. NOTE: I don't
         love the name of this attribute.
     """
-    def __init__(self, asset, correction):
+    def __init__(self, asset, correction, prices=None):
         """
         Initializing this class basically does all the work of
         creating a DataFrame that holds all the drawdown periods.
@@ -42,22 +42,34 @@ class MarketCorrections:
             Threshold level which determines the market correction to
             be identified.  For example a value of -0.05 will find all
             corrections greater that 5%.
+
+        prices: pd.DataFrame
+            Contains a date column and a price column for the asset.  The
+            prices are downloaded from Yahoo finance when this is not
+            given.
         """
-        # downloading the prices from Yahoo finance
         self.correction = correction
         self.asset = asset
-        self.prices = yf.download(
-            self.asset,
-            start="1900-01-01",
-            end=datetime.date.today() + datetime.timedelta(days=1),
-            auto_adjust=False
-        )
+        if prices is not None:
+            self.prices = \
+                prices[["date", self.asset.lower()]].dropna().reset_index(
+                    drop=True)
+        else:
+            # downloading the prices from Yahoo finance, importing yfinance
+            # here so that it is only loaded when it is needed
+            import yfinance as yf
+            self.prices = yf.download(
+                self.asset,
+                start="1900-01-01",
+                end=datetime.date.today() + datetime.timedelta(days=1),
+                auto_adjust=False
+            )
 
-        # cleaning up the prices DataFrame
-        self.prices = self.prices["Adj Close"].reset_index()
-        self.prices["Date"] = self.prices["Date"].dt.date
-        self.prices.columns = self.prices.columns.str.lower()
-        self.prices = self.prices.rename_axis(None, axis=1)
+            # cleaning up the prices DataFrame
+            self.prices = self.prices["Adj Close"].reset_index()
+            self.prices["Date"] = self.prices["Date"].dt.date
+            self.prices.columns = self.prices.columns.str.lower()
+            self.prices = self.prices.rename_axis(None, axis=1)
 
         # calculating returns, equity curve, drawdown
         col_name_ret = "ret_" + self.asset.lower()
@@ -72,34 +84,90 @@ class MarketCorrections:
             (self.prices[col_name_equity] /
              self.prices[col_name_equity].cummax()) - 1
 
-        # determining drawdown period start and end dates
-        query = f"{col_name_drawdown} == 0"
-        dates_start = \
-            self.prices.query(query)["date"].iloc[:-1].values
-        dates_end = self.prices.query(query)["date"].iloc[1:].values
-        self.drawdown_periods = pd.DataFrame({
-            "start": dates_start,
-            "end": dates_end,
-        }).reset_index(drop=True)
-
-        # iterating through dates and collecting drawdowns and bottom dates
-        period_drawdowns = []
-        dates_bottom = []
-        for ix in self.drawdown_periods.index:
-            date_start = self.drawdown_periods.at[ix, "start"]
-            mask_start = date_start <= self.prices["date"]
-            date_end = self.drawdown_periods.at[ix, "end"]
-            mask_end = self.prices["date"] <= date_end
-            df_drawdown = self.prices[mask_start & mask_end]
-            drawdown = df_drawdown[col_name_drawdown].min()
-            query = f"{col_name_drawdown} == @drawdown"
-            date_bottom = df_drawdown.query(query)["date"].iloc[0]
-            period_drawdowns.append(drawdown)
-            dates_bottom.append(date_bottom)
-        self.drawdown_periods["bottom"] = dates_bottom
-        self.drawdown_periods[col_name_drawdown] = period_drawdowns
+        # determining drawdown periods with their bottom dates and drawdowns
+        self.drawdown_periods = drawdown_episodes(
+            self.prices["date"].values,
+            self.prices[self.asset.lower()].values,
+        ).rename(columns={"drawdown": col_name_drawdown})
 
         # filtering for corrections
         query = f"{col_name_drawdown} < @self.correction"
         self.corrections = \
             self.drawdown_periods.query(query).reset_index(drop=True)
+
+
+class MultiMarketCorrections:
+    """
+    Finds market corrections for many assets and many correction
+    threshold levels at once from prices that have already been
+    fetched.  The drawdown episodes of each asset are found in a single
+    pass over its prices and then filtered for every threshold.
+
+    Attributes
+    ----------
+    assets: list[str]
+        Tickers of the assets for which to find corrections.
+
+    corrections_thresholds: list[float]
+        Threshold levels which determine the market corrections to be
+        identified.  For example a value of -0.05 will find all
+        corrections greater than 5%.
+
+    drawdown_periods: pd.DataFrame
+        All drawdown periods for every asset, keyed by asset.
+
+    corrections: pd.DataFrame
+        All drawdown periods that exceed each threshold, in long-form
+        with one row per asset, threshold and period.
+    """
+    def __init__(self,
+                 prices: pd.DataFrame,
+                 corrections_thresholds: list[float],
+                 assets: list[str] = None):
+        """
+        Parameters:
+        -----------
+        prices: pd.DataFrame
+            Contains a date column and a price column for each asset.
+            This is typically the result of the PriceFetcher.fetch()
+            method.
+
+        corrections_thresholds: list[float]
+            Threshold levels which determine the market corrections to be
+            identified.  For example a value of -0.05 will find all
+            corrections greater than 5%.
+
+        assets: list[str]
+            Tickers of the assets for which to find corrections.  All
+            price columns are used when this is not given.
+        """
+        if assets is None:
+            assets = [x for x in prices.columns if x != "date"]
+        self.assets = list(assets)
+        self.corrections_thresholds = list(corrections_thresholds)
+
+        # finding the drawdown periods of each asset in a single pass
+        lst_periods = []
+        for ix_asset in self.assets:
+            df_asset = prices[["date", ix_asset]].dropna()
+            df_periods = drawdown_episodes(
+                df_asset["date"].values,
+                df_asset[ix_asset].values,
+            )
+            df_periods.insert(0, "asset", ix_asset)
+            lst_periods.append(df_periods)
+        self.drawdown_periods = \
+            pd.concat(lst_periods, ignore_index=True)
+
+        # filtering for corrections at every threshold
+        lst_corrections = []
+        for ix_threshold in self.corrections_thresholds:
+            mask = self.drawdown_periods["drawdown"] < ix_threshold
+            df_corrections = self.drawdown_periods[mask].copy()
+            df_corrections.insert(1, "threshold", ix_threshold)
+            lst_corrections.append(df_corrections)
+        self.corrections = (
+            pd.concat(lst_corrections, ignore_index=True)
+            .sort_values(["asset", "threshold", "start"], kind="stable")
+            .reset_index(drop=True)
+        )
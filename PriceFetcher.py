@@ -1,4 +1,3 @@
-import yfinance as yf
 import datetime
 
 
@@ -37,7 +36,9 @@ class PriceFetcher:
         """
         Downloads adjusted close prices from Yahoo finance.
         """
-        # downloading the prices from Yahoo finance
+        # downloading the prices from Yahoo finance, importing yfinance here
+        # so that it is only loaded when it is needed
+        import yfinance as yf
         self.prices = yf.download(
             self.assets,
             start="1900-01-01",
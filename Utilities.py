@@ -1,3 +1,4 @@
+import numpy as np
 import pandas as pd
 import datetime
 
@@ -32,3 +33,274 @@ def period_max_drawdown(
     df["drawdown"] = (df[col_name] / df[col_name].cummax()) - 1
 
     return df["drawdown"].min()
+
+
+def drawdown_episodes(
+        dates: np.ndarray,
+        prices: np.ndarray) -> pd.DataFrame:
+    """
+    Finds every completed drawdown episode of a price series in a
+    single pass.  An episode starts on a new high of the equity curve
+    and ends on the next new high.  A drawdown that has not recovered
+    by the last date is not a completed episode and is left out.
+
+    Parameters:
+    ---
+    dates: np.ndarray
+        Dates of the prices, in ascending order.
+
+    prices: np.ndarray
+        Prices of the asset, without missing values.
+    ---
+    """
+    prices = np.asarray(prices, dtype=float)
+    ret = np.zeros(len(prices))
+    ret[1:] = prices[1:] / prices[:-1] - 1
+    equity = np.cumprod(1 + ret)
+    drawdown = (equity / np.maximum.accumulate(equity)) - 1
+
+    ix_high = np.flatnonzero(drawdown == 0)
+    if len(ix_high) < 2:
+        return pd.DataFrame({
+            "start": dates[:0],
+            "end": dates[:0],
+            "bottom": dates[:0],
+            "drawdown": np.empty(0),
+        })
+
+    # each episode is the slice between two consecutive new highs
+    ix_start = ix_high[:-1]
+    ix_end = ix_high[1:]
+    drawdowns = np.minimum.reduceat(drawdown[:ix_end[-1]], ix_start)
+
+    # the bottom is the first date the episode reaches its minimum
+    episode = np.cumsum(drawdown == 0) - 1
+    in_range = np.arange(len(drawdown)) < ix_end[-1]
+    mask_bottom = in_range & (drawdown == drawdowns[np.minimum(
+        episode, len(drawdowns) - 1)])
+    _, ix_first = np.unique(episode[mask_bottom], return_index=True)
+    ix_bottom = np.flatnonzero(mask_bottom)[ix_first]
+
+    return pd.DataFrame({
+        "start": dates[ix_start],
+        "end": dates[ix_end],
+        "bottom": dates[ix_bottom],
+        "drawdown": drawdowns,
+    })
+
+
+def calc_statistics(
+        returns: np.ndarray,
+        equity: np.ndarray,
+        names: list[str],
+        periods_per_year: int = 252,
+        var_level: float = 0.95,
+        tail_statistics: bool = True) -> pd.DataFrame:
+    """
+    Calculates the performance statistics of many return series at once
+    with column-wise NumPy reductions.
+
+    Parameters:
+    ---
+    returns: np.ndarray
+        (days x columns) matrix of daily returns.  The first row is the
+        start of the backtest and is not counted as a return.
+
+    equity: np.ndarray
+        (days x columns) matrix of equity curves that start at 1.
+
+    names: list[str]
+        Name of each column, used as the index of the result.
+
+    periods_per_year: int
+        Number of return periods in a year, used to annualize.
+
+    var_level: float
+        Confidence level of the historical value-at-risk and
+        conditional value-at-risk.
+
+    tail_statistics: bool
+        Whether to calculate the skew, kurtosis, value-at-risk and
+        conditional value-at-risk, which are the costly statistics.  They
+        are NaN when this is False.
+    ---
+    """
+    returns = np.asarray(returns, dtype=float)[1:]
+    equity = np.asarray(equity, dtype=float)
+    n = returns.shape[0]
+
+    # central moments of the daily returns
+    mean = returns.mean(axis=0)
+    deviations = returns - mean
+    deviations_sq = deviations * deviations
+    m2 = deviations_sq.sum(axis=0)
+    downside = np.square(np.minimum(returns, 0)).sum(axis=0)
+    if tail_statistics:
+        m3 = (deviations_sq * deviations).sum(axis=0)
+        m4 = (deviations_sq * deviations_sq).sum(axis=0)
+    else:
+        m3 = np.full(returns.shape[1], np.nan)
+        m4 = np.full(returns.shape[1], np.nan)
+
+    # path dependent statistics
+    equity_last = equity[-1]
+    drawdown_max = (
+        equity / np.maximum.accumulate(equity, axis=0) - 1
+    ).min(axis=0)
+
+    # historical value-at-risk and conditional value-at-risk
+    if tail_statistics:
+        value_at_risk = np.quantile(returns, 1 - var_level, axis=0)
+        mask_tail = returns <= value_at_risk
+        conditional_value_at_risk = \
+            (returns * mask_tail).sum(axis=0) / mask_tail.sum(axis=0)
+    else:
+        value_at_risk = np.full(returns.shape[1], np.nan)
+        conditional_value_at_risk = np.full(returns.shape[1], np.nan)
+
+    return statistics_from_moments(
+        n, mean, m2, m3, m4, downside, equity_last, drawdown_max,
+        value_at_risk, conditional_value_at_risk, names, periods_per_year,
+    )
+
+
+def statistics_from_moments(
+        n: int,
+        mean: np.ndarray,
+        m2: np.ndarray,
+        m3: np.ndarray,
+        m4: np.ndarray,
+        downside: np.ndarray,
+        equity_last: np.ndarray,
+        drawdown_max: np.ndarray,
+        value_at_risk: np.ndarray,
+        conditional_value_at_risk: np.ndarray,
+        names: list[str],
+        periods_per_year: int) -> pd.DataFrame:
+    """
+    Turns the count, mean and summed central moments of the returns into
+    the table of statistics returned by calc_statistics().  Skew and
+    kurtosis are bias-corrected to match pandas.
+    """
+    with np.errstate(divide="ignore", invalid="ignore"):
+        std = np.sqrt(m2 / (n - 1))
+        g1 = np.sqrt(n) * m3 / m2 ** 1.5
+        g2 = n * m4 / m2 ** 2 - 3
+        annual_return = equity_last ** (periods_per_year / n) - 1
+        statistics = pd.DataFrame({
+            "cumulative_return": equity_last - 1,
+            "annual_return": annual_return,
+            "volatility": std * np.sqrt(periods_per_year),
+            "sharpe_ratio": mean / std * np.sqrt(periods_per_year),
+            "sortino_ratio":
+                mean / np.sqrt(downside / n) * np.sqrt(periods_per_year),
+            "calmar_ratio": annual_return / np.abs(drawdown_max),
+            "skew": np.sqrt(n * (n - 1)) / (n - 2) * g1,
+            "kurtosis":
+                ((n + 1) * g2 + 6) * (n - 1) / ((n - 2) * (n - 3)),
+            "drawdown_max": drawdown_max,
+            "value_at_risk": value_at_risk,
+            "conditional_value_at_risk": conditional_value_at_risk,
+        }, index=pd.Index(names, name="asset"))
+
+    return statistics
+
+
+def period_keys(dates: pd.Series, frequency: str) -> np.ndarray:
+    """
+    Labels each date with the rebalancing period it belongs to.  The
+    last date of each period is the rebalance date.  A "daily" period is
+    a single date, so intraday bars are each rebalanced, matching the
+    in-memory backtest.
+
+    Parameters:
+    ---
+    dates: pd.Series
+        Dates of the backtest.
+
+    frequency: str
+        One of "annual", "semiannual", "quarterly", "monthly" or "daily".
+    ---
+    """
+    dates = pd.to_datetime(dates)
+    year = dates.dt.year.values.astype(np.int64)
+    if frequency == "annual":
+        keys = year
+    elif frequency == "semiannual":
+        keys = year * 2 + (dates.dt.month.values > 6)
+    elif frequency == "quarterly":
+        keys = year * 4 + dates.dt.quarter.values
+    elif frequency == "monthly":
+        keys = year * 12 + dates.dt.month.values
+    elif frequency == "daily":
+        keys = dates.values.astype(np.int64)
+    else:
+        raise ValueError(f"unknown rebalance frequency: {frequency}")
+
+    return keys
+
+
+class RunningMoments:
+    """
+    Count, mean and summed central moments of many return series that
+    are updated one batch of rows at a time, so that statistics can be
+    calculated without holding the full history in memory.  Batches are
+    combined with the pairwise update formulas of Chan et al. and Pebay.
+
+    Attributes
+    ----------
+    n: int
+        Number of rows seen so far.
+
+    mean: np.ndarray
+        Mean of each column.
+
+    m2, m3, m4: np.ndarray
+        Sums of the 2nd, 3rd and 4th powers of the deviations from the
+        mean of each column.
+
+    downside: np.ndarray
+        Sum of the squared negative returns of each column.
+    """
+    def __init__(self, n_columns: int):
+        self.n = 0
+        self.mean = np.zeros(n_columns)
+        self.m2 = np.zeros(n_columns)
+        self.m3 = np.zeros(n_columns)
+        self.m4 = np.zeros(n_columns)
+        self.downside = np.zeros(n_columns)
+
+    def update(self, returns: np.ndarray) -> None:
+        """
+        Adds a (rows x columns) batch of returns.
+        """
+        n_b = returns.shape[0]
+        if n_b == 0:
+            return
+        mean_b = returns.mean(axis=0)
+        deviations = returns - mean_b
+        deviations_sq = deviations * deviations
+        m2_b = deviations_sq.sum(axis=0)
+        m3_b = (deviations_sq * deviations).sum(axis=0)
+        m4_b = (deviations_sq * deviations_sq).sum(axis=0)
+        self.downside += np.square(np.minimum(returns, 0)).sum(axis=0)
+
+        n_a = self.n
+        n = n_a + n_b
+        delta = mean_b - self.mean
+        m2_a, m3_a = self.m2, self.m3
+        self.m4 = (
+            self.m4 + m4_b
+            + delta ** 4 * n_a * n_b * (n_a ** 2 - n_a * n_b + n_b ** 2)
+            / n ** 3
+            + 6 * delta ** 2 * (n_a ** 2 * m2_b + n_b ** 2 * m2_a) / n ** 2
+            + 4 * delta * (n_a * m3_b - n_b * m3_a) / n
+        )
+        self.m3 = (
+            m3_a + m3_b
+            + delta ** 3 * n_a * n_b * (n_a - n_b) / n ** 2
+            + 3 * delta * (n_a * m2_b - n_b * m2_a) / n
+        )
+        self.m2 = m2_a + m2_b + delta ** 2 * n_a * n_b / n
+        self.mean = self.mean + delta * n_b / n
+        self.n = n
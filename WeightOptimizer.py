@@ -0,0 +1,389 @@
+import numpy as np
+import pandas as pd
+import datetime
+from Utilities import calc_statistics, period_keys
+
+
+# direction in which each supported objective is improved
+OBJECTIVES = {
+    "annual_return": 1,
+    "sharpe_ratio": 1,
+    "sortino_ratio": 1,
+    "calmar_ratio": 1,
+    "drawdown_max": 1,
+    "volatility": -1,
+}
+
+
+class WeightOptimizer:
+    """
+    Searches the weights of a fixed weight portfolio for the ones that
+    maximize the sharpe-ratio or minimize the maximum drawdown, subject to
+    per-asset bounds, taking the rebalancing frequency into account.
+
+    Candidate portfolios are evaluated in vectorized batches.  Between two
+    rebalance dates the value of a portfolio is its weights times the
+    growth of each asset since the last rebalance, so the matrix of that
+    growth is calculated once and every batch of candidates is valued with
+    a single matrix product.
+
+    Attributes
+    ----------
+    assets: list[str]
+        The assets in the universe of the portfolio.
+
+    bounds: dict[str, tuple[float, float]]
+        Lower and upper bound of the weight of each asset.
+
+    date_start: datetime.date
+        The start date of the backtest.
+
+    date_end: datetime.date
+        The end date of the backtest.
+
+    frequency_rebalance: str
+        Rebalancing frequency, as in FixedWeightBacktester.
+
+    candidates: pd.DataFrame
+        The weights and statistics of every candidate portfolio evaluated
+        by optimize().
+
+    frontier: pd.DataFrame
+        The candidates on the efficient frontier: no other candidate has
+        both a higher annual return and a lower volatility.  It is traced
+        from the minimum volatility to the maximum return portfolio by
+        maximizing the return at a series of target volatilities.
+
+    weights_optimal: dict[str, float]
+        The weights of the best candidate found by optimize().
+
+    statistics_optimal: pd.Series
+        The statistics of the best candidate found by optimize().
+
+    periods_per_year: int
+        Number of price rows in a year, used to annualize.
+    """
+    def __init__(self,
+                 assets: list[str],
+                 prices: pd.DataFrame,
+                 date_start: datetime.date,
+                 date_end: datetime.date,
+                 frequency_rebalance: str,
+                 bounds: dict[str, tuple[float, float]] = None,
+                 periods_per_year: int = 252):
+        """
+        assets: list[str]
+            The assets in the universe of the portfolio.
+
+        prices: pd.DataFrame
+            Contains the prices of historical prices of assets.
+            This is typically the result of the PriceFetcher.fetch() method.
+
+        date_start: datetime.date
+            The start date of the backtest.
+
+        date_end: datetime.date
+            The end date of the backtest.
+
+        frequency_rebalance: str
+            Rebalancing frequency, as in FixedWeightBacktester.
+
+        bounds: dict[str, tuple[float, float]]
+            Lower and upper bound of the weight of each asset.  Assets
+            that are left out are bounded by 0 and 1.
+
+        periods_per_year: int
+            Number of price rows in a year, used to annualize.
+        """
+        self.assets = list(assets)
+        self.date_start = date_start
+        self.date_end = date_end
+        self.frequency_rebalance = frequency_rebalance
+        self.periods_per_year = periods_per_year
+        self.bounds = {x: (0.0, 1.0) for x in self.assets}
+        if bounds is not None:
+            unknown = set(bounds) - set(self.assets)
+            if unknown:
+                raise ValueError(
+                    f"bounds for assets not in universe: {sorted(unknown)}"
+                )
+            self.bounds.update(bounds)
+        for asset, (lower, upper) in self.bounds.items():
+            if lower > upper:
+                raise ValueError(f"lower bound above upper bound: {asset}")
+        self._lower = np.array([self.bounds[x][0] for x in self.assets])
+        self._upper = np.array([self.bounds[x][1] for x in self.assets])
+        if self._lower.sum() > 1 or self._upper.sum() < 1:
+            raise ValueError("bounds do not allow weights that sum to 1")
+
+        self.candidates = None
+        self.frontier = None
+        self.weights_optimal = None
+        self.statistics_optimal = None
+
+        df_prices = (
+            prices[["date"] + self.assets]
+            .query("@date_start <= date & date <= @date_end")
+            .dropna()
+            .reset_index(drop=True)
+        )
+        if len(df_prices) < 2:
+            raise ValueError("not enough complete prices in backtest window")
+        prices_assets = df_prices[self.assets].values
+        growth = prices_assets / prices_assets[0]
+
+        # a row is a rebalance date when it is the last row of its period
+        if frequency_rebalance is None:
+            is_rebalance = np.ones(len(df_prices), dtype=bool)
+        else:
+            keys = period_keys(df_prices["date"], frequency_rebalance)
+            is_rebalance = np.append(keys[:-1] != keys[1:], True)
+        is_rebalance[0] = True
+
+        # each row is valued from the last rebalance strictly before it
+        ix_anchor = np.maximum.accumulate(
+            np.where(is_rebalance, np.arange(len(df_prices)), 0)
+        )
+        ix_anchor = np.concatenate([[0], ix_anchor[:-1]])
+        self._ix_anchor_rows = np.flatnonzero(is_rebalance)
+        self._ix_anchor = np.searchsorted(self._ix_anchor_rows, ix_anchor)
+        self._growth_since_anchor = growth / growth[ix_anchor]
+
+    def evaluate(self, weights: np.ndarray) -> pd.DataFrame:
+        """
+        Calculates the statistics of a (candidates x assets) matrix of
+        portfolio weights, one row of statistics per candidate.  The
+        weights of each candidate must sum to 1.
+        """
+        weights = np.atleast_2d(np.asarray(weights, dtype=float))
+        if weights.shape[1] != len(self.assets):
+            raise ValueError("weights need one column per asset")
+        if not np.allclose(weights.sum(axis=1), 1):
+            raise ValueError("weights of each candidate must sum to 1")
+        equity = self._equity(weights)
+        returns = np.zeros_like(equity)
+        returns[1:] = equity[1:] / equity[:-1] - 1
+
+        return calc_statistics(
+            returns, equity, list(range(len(weights))), self.periods_per_year
+        )
+
+    def _score(self, weights: np.ndarray) -> pd.DataFrame:
+        """
+        Calculates the statistics used by the search, leaving out the
+        costly tail statistics.
+        """
+        equity = self._equity(weights)
+        returns = np.zeros_like(equity)
+        returns[1:] = equity[1:] / equity[:-1] - 1
+
+        return calc_statistics(
+            returns, equity, list(range(len(weights))), self.periods_per_year,
+            tail_statistics=False,
+        ).drop(columns=[
+            "skew", "kurtosis", "value_at_risk", "conditional_value_at_risk"
+        ]).reset_index(drop=True)
+
+    def _equity(self, weights: np.ndarray) -> np.ndarray:
+        """
+        Calculates the (days x candidates) equity curves of the weights.
+        """
+        growth = self._growth_since_anchor @ weights.T
+        equity_anchor = np.cumprod(growth[self._ix_anchor_rows], axis=0)
+        return equity_anchor[self._ix_anchor] * growth
+
+    def _project(self, weights: np.ndarray) -> np.ndarray:
+        """
+        Projects each row of weights onto the weights that sum to 1 and
+        are within the bounds, by bisecting for the shift that does so.
+        """
+        shift_low = (weights - self._upper).min(axis=1, keepdims=True)
+        shift_high = (weights - self._lower).max(axis=1, keepdims=True)
+        for _ in range(60):
+            shift = (shift_low + shift_high) / 2
+            total = np.clip(weights - shift, self._lower, self._upper).sum(
+                axis=1, keepdims=True)
+            shift_low = np.where(total > 1, shift, shift_low)
+            shift_high = np.where(total > 1, shift_high, shift)
+        shift = (shift_low + shift_high) / 2
+
+        return np.clip(weights - shift, self._lower, self._upper)
+
+    def _corners(self) -> np.ndarray:
+        """
+        The equal weight portfolio and, for each asset, the portfolio with
+        as much of that asset as the bounds allow.
+        """
+        n_assets = len(self.assets)
+        weights = np.vstack([
+            np.full(n_assets, 1 / n_assets),
+            np.eye(n_assets) * 2 * n_assets,
+        ])
+
+        return self._project(weights)
+
+    def _search(self,
+                score,
+                weights_start: np.ndarray,
+                n_candidates: int,
+                n_iterations: int,
+                rng: np.random.Generator):
+        """
+        Random search of the bounded simplex for the highest score.  The
+        first batch is weights_start plus random draws, half of them
+        sparse so that the edges of the simplex are sampled too.  Each
+        iteration draws new candidates around the best tenth of those seen
+        so far with a shrinking step.
+
+        score: Callable[[pd.DataFrame], np.ndarray]
+            Maps the statistics of a batch of candidates to their scores.
+
+        Returns the weights, statistics and scores of every candidate.
+        """
+        n_assets = len(self.assets)
+        weights = self._project(np.vstack([
+            weights_start,
+            rng.dirichlet(np.ones(n_assets), n_candidates - n_candidates // 2),
+            rng.dirichlet(np.full(n_assets, 0.2), n_candidates // 2),
+        ]))
+
+        lst_weights = []
+        lst_statistics = []
+        scores = np.empty(0)
+        step = 0.1
+        for ix_iteration in range(n_iterations + 1):
+            if ix_iteration > 0:
+                n_elite = max(1, len(scores) // 10)
+                elite = np.vstack(lst_weights)[np.argsort(-scores)[:n_elite]]
+                weights = elite[rng.integers(n_elite, size=n_candidates)]
+                weights = self._project(
+                    weights + rng.normal(0, step, weights.shape)
+                )
+                step *= 0.7
+            df_statistics = self._score(weights)
+            lst_weights.append(weights)
+            lst_statistics.append(df_statistics)
+            scores = np.append(
+                scores, np.nan_to_num(score(df_statistics), nan=-np.inf)
+            )
+
+        return (
+            np.vstack(lst_weights),
+            pd.concat(lst_statistics, ignore_index=True),
+            scores,
+        )
+
+    def optimize(self,
+                 objective: str = "sharpe_ratio",
+                 n_candidates: int = 500,
+                 n_iterations: int = 10,
+                 initial_weights: dict[str, float] = None,
+                 seed: int = None,
+                 n_frontier: int = 15) -> None:
+        """
+        Searches the weights for the best value of objective and traces
+        the efficient frontier.  The search is warm-started from
+        initial_weights, or from the result of the previous call, and from
+        the corners of the bounds.
+
+        The frontier is traced by searching for the minimum volatility and
+        maximum return portfolios, then for the highest return at each of
+        a series of target volatilities between them, each search warm
+        started from the previous one.  The frontier is the Pareto set of
+        every candidate evaluated.
+
+        objective: str
+            "sharpe_ratio", "sortino_ratio", "calmar_ratio",
+            "annual_return" or "volatility", or "drawdown_max" to minimize
+            the maximum drawdown.
+
+        n_candidates: int
+            Number of candidates evaluated in each batch.
+
+        n_iterations: int
+            Number of batches after the first one.
+
+        initial_weights: dict[str, float]
+            Weights to start the search from.
+
+        seed: int
+            Seed of the random number generator.
+
+        n_frontier: int
+            Number of target volatilities on the frontier.
+        """
+        if objective not in OBJECTIVES:
+            raise ValueError(f"unknown objective: {objective}")
+        direction = OBJECTIVES[objective]
+        rng = np.random.default_rng(seed)
+
+        # warm start from the corners and the given or previous weights
+        weights_start = self._corners()
+        if initial_weights is None:
+            initial_weights = self.weights_optimal
+        if initial_weights is not None:
+            weights_start = np.vstack([
+                weights_start,
+                self._project(np.array(
+                    [[initial_weights.get(x, 0) for x in self.assets]]
+                )),
+            ])
+
+        # every search adds its candidates to the ones the frontier is
+        # taken from and returns the weights and statistics of its best
+        lst_weights = []
+        lst_statistics = []
+
+        def search(score, weights_start, n_candidates, n_iterations):
+            weights, df_statistics, scores = self._search(
+                score, weights_start, n_candidates, n_iterations, rng)
+            lst_weights.append(weights)
+            lst_statistics.append(df_statistics)
+            ix_best = np.argmax(scores)
+            return weights[ix_best], df_statistics.iloc[ix_best]
+
+        weights_best, _ = search(
+            lambda x: direction * x[objective].values,
+            weights_start, n_candidates, n_iterations,
+        )
+
+        # tracing the frontier from its two ends at target volatilities
+        n_candidates_frontier = max(n_candidates // 4, 50)
+        n_iterations_frontier = max(n_iterations // 2, 1)
+        weights_start = np.vstack([weights_start, weights_best])
+        weights_low, statistics_low = search(
+            lambda x: -x["volatility"].values,
+            weights_start, n_candidates_frontier, n_iterations_frontier,
+        )
+        weights_high, statistics_high = search(
+            lambda x: x["annual_return"].values,
+            weights_start, n_candidates_frontier, n_iterations_frontier,
+        )
+        weights_previous = np.vstack([weights_low, weights_high])
+        targets = np.linspace(
+            statistics_low["volatility"],
+            statistics_high["volatility"],
+            n_frontier,
+        )[1:-1]
+        for target in targets:
+            weights_previous, _ = search(
+                lambda x: x["annual_return"].values
+                - 100 * np.maximum(x["volatility"].values - target, 0),
+                np.vstack([weights_start, weights_previous]),
+                n_candidates_frontier,
+                n_iterations_frontier,
+            )
+
+        # collecting the candidates and finding the efficient frontier
+        self.candidates = pd.concat([
+            pd.DataFrame(np.vstack(lst_weights), columns=self.assets),
+            pd.concat(lst_statistics, ignore_index=True),
+        ], axis=1)
+        df_sorted = self.candidates.sort_values(
+            ["volatility", "annual_return"], ascending=[True, False])
+        mask_frontier = df_sorted["annual_return"] > \
+            df_sorted["annual_return"].cummax().shift(fill_value=-np.inf)
+        self.frontier = df_sorted[mask_frontier].reset_index(drop=True)
+
+        self.weights_optimal = dict(zip(self.assets, weights_best))
+        self.statistics_optimal = self.evaluate(weights_best).iloc[0]
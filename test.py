@@ -2,8 +2,16 @@ import pytest
 import numpy as np
 import pandas as pd
 import datetime
+import json
+import os
+import subprocess
+import sys
 from FixedWieightBacktester import FixedWeightBacktester
-# from MarketCorrections import MarketCorrections
+from MarketCorrections import MarketCorrections, MultiMarketCorrections
+from BacktestExporter import BacktestExporter
+import BatchRunner
+from WeightOptimizer import WeightOptimizer
+from Utilities import period_max_drawdown
 
 
 @pytest.fixture
@@ -95,19 +103,24 @@ class TesterFixedWeightBacktester:
 
         accuracy = 7
         # cumulative return
-        assert np.round(drb.cumulative_return["portfolio"], accuracy) == \
+        assert np.round(
+            drb.statistics.at["portfolio", "cumulative_return"], accuracy) == \
             np.round(2.78577924743747, accuracy)
         # annualized return
-        assert np.round(drb.annual_return["portfolio"], accuracy) == \
+        assert np.round(
+            drb.statistics.at["portfolio", "annual_return"], accuracy) == \
             np.round(0.0780835704957896, accuracy)
         # volatility
-        assert np.round(drb.volatility["portfolio"], accuracy) == \
+        assert np.round(
+            drb.statistics.at["portfolio", "volatility"], accuracy) == \
             np.round(0.143624563266703, accuracy)
         # sharpe
-        assert np.round(drb.sharpe_ratio["portfolio"], accuracy) == \
+        assert np.round(
+            drb.statistics.at["portfolio", "sharpe_ratio"], accuracy) == \
             np.round(0.595393084079564, accuracy)
         # maximum drawdown
-        assert np.round(drb.drawdown_max["portfolio"], accuracy) == \
+        assert np.round(
+            drb.statistics.at["portfolio", "drawdown_max"], accuracy) == \
             np.round(-0.441957538955252, accuracy)
 
     def test_balanced_1_monthly(self, price_test_data):
@@ -133,19 +146,24 @@ class TesterFixedWeightBacktester:
 
         accuracy = 7
         # cumulative return
-        assert np.round(drb.cumulative_return["portfolio"], accuracy) == \
+        assert np.round(
+            drb.statistics.at["portfolio", "cumulative_return"], accuracy) == \
             np.round(2.48981811791493, accuracy)
         # annualized return
-        assert np.round(drb.annual_return["portfolio"], accuracy) == \
+        assert np.round(
+            drb.statistics.at["portfolio", "annual_return"], accuracy) == \
             np.round(0.0731386282783451, accuracy)
         # volatility
-        assert np.round(drb.volatility["portfolio"], accuracy) == \
+        assert np.round(
+            drb.statistics.at["portfolio", "volatility"], accuracy) == \
             np.round(0.103533683282768, accuracy)
         # sharpe
-        assert np.round(drb.sharpe_ratio["portfolio"], accuracy) == \
+        assert np.round(
+            drb.statistics.at["portfolio", "sharpe_ratio"], accuracy) == \
             np.round(0.733648500090021, accuracy)
         # maximum drawdown
-        assert np.round(drb.drawdown_max["portfolio"], accuracy) == \
+        assert np.round(
+            drb.statistics.at["portfolio", "drawdown_max"], accuracy) == \
             np.round(-0.317950340976042, accuracy)
 
     def test_growth_model_4_quarterly(self, price_test_data):
@@ -170,17 +188,630 @@ class TesterFixedWeightBacktester:
 
         accuracy = 7
         # cumulative return
-        assert np.round(drb.cumulative_return["portfolio"], accuracy) == \
+        assert np.round(
+            drb.statistics.at["portfolio", "cumulative_return"], accuracy) == \
             np.round(0.396966691564179, accuracy)
         # annualized return
-        assert np.round(drb.annual_return["portfolio"], accuracy) == \
+        assert np.round(
+            drb.statistics.at["portfolio", "annual_return"], accuracy) == \
             np.round(0.0874388900207699, accuracy)
         # volatility
-        assert np.round(drb.volatility["portfolio"], accuracy) == \
+        assert np.round(
+            drb.statistics.at["portfolio", "volatility"], accuracy) == \
             np.round(0.125106555535225, accuracy)
         # sharpe
-        assert np.round(drb.sharpe_ratio["portfolio"], accuracy) == \
+        assert np.round(
+            drb.statistics.at["portfolio", "sharpe_ratio"], accuracy) == \
             np.round(0.732673101132687, accuracy)
         # maximum drawdown
-        assert np.round(drb.drawdown_max["portfolio"], accuracy) == \
+        assert np.round(
+            drb.statistics.at["portfolio", "drawdown_max"], accuracy) == \
             np.round(-0.228886156467139, accuracy)
+
+    def test_statistics_all_columns(self, price_test_data):
+        portfolio = {
+            "spy": 0.6,
+            "agg": 0.3,
+            "gld": 0.1,
+        }
+        date_start = datetime.date(2010, 1, 4)
+        date_end = datetime.date(2024, 12, 31)
+        drb = FixedWeightBacktester(
+            portfolio,
+            price_test_data,
+            date_start,
+            date_end,
+            "annual")
+        drb.calc_daily_returns()
+        drb.calc_portfolio_statistics()
+
+        assert list(drb.statistics.index) == \
+            ["spy", "agg", "gld", "portfolio"]
+        for ix_asset in drb.statistics.index:
+            ret = drb.returns["ret_" + ix_asset][1:]
+            equity = drb.returns["equity_" + ix_asset]
+            drawdown_max = drb.returns["drawdown_" + ix_asset].min()
+            annual_return = equity.iloc[-1] ** (252 / len(ret)) - 1
+            var = ret.quantile(0.05)
+            expected = {
+                "cumulative_return": equity.iloc[-1] - 1,
+                "annual_return": annual_return,
+                "volatility": ret.std() * np.sqrt(252),
+                "sharpe_ratio": ret.mean() / ret.std() * np.sqrt(252),
+                "sortino_ratio": ret.mean() / np.sqrt(
+                    (ret.clip(upper=0) ** 2).mean()) * np.sqrt(252),
+                "calmar_ratio": annual_return / abs(drawdown_max),
+                "skew": ret.skew(),
+                "kurtosis": ret.kurt(),
+                "drawdown_max": drawdown_max,
+                "value_at_risk": var,
+                "conditional_value_at_risk": ret[ret <= var].mean(),
+            }
+            for statistic, value in expected.items():
+                assert np.isclose(
+                    drb.statistics.at[ix_asset, statistic], value,
+                    rtol=1e-9, atol=0,
+                )
+
+    def test_streaming_matches_in_memory(self, price_test_data, tmp_path):
+        portfolio = {
+            "spy": 0.45,
+            "agg": 0.1,
+            "tlt": 0.2,
+            "buffer_010": 0.1,
+            "buffer_020": 0.1,
+            "buffer_100": 0.05,
+        }
+        date_start = datetime.date(2008, 1, 2)
+        date_end = datetime.date(2024, 12, 31)
+        path = str(tmp_path / "prices.csv")
+        price_test_data.to_csv(path, index=False)
+        for frequency in [None, "daily", "monthly", "annual"]:
+            drb = FixedWeightBacktester(
+                portfolio,
+                price_test_data,
+                date_start,
+                date_end,
+                frequency)
+            drb.calc_daily_returns()
+            drb.calc_portfolio_statistics()
+
+            drb_streaming = FixedWeightBacktester(
+                portfolio,
+                None,
+                date_start,
+                date_end,
+                frequency)
+            drb_streaming.calc_streaming_statistics(path, chunksize=250)
+
+            columns = ["cumulative_return", "annual_return", "volatility",
+                       "sharpe_ratio", "sortino_ratio", "calmar_ratio",
+                       "skew", "kurtosis", "drawdown_max"]
+            assert np.allclose(
+                drb_streaming.statistics[columns],
+                drb.statistics[columns],
+                rtol=1e-9,
+                atol=1e-12,
+            )
+            assert np.allclose(
+                drb_streaming.annual_performance["ret_portfolio"],
+                drb.annual_performance["ret_portfolio"],
+                rtol=1e-9,
+                atol=1e-12,
+            )
+
+    def test_streaming_intraday_bars(self):
+        # 30 one-minute bars on each business day of 2023 Q1
+        rng = np.random.default_rng(0)
+        days = pd.bdate_range("2023-01-02", "2023-03-30")
+        dates = (
+            days.repeat(30)
+            + pd.to_timedelta(np.tile(np.arange(30), len(days)), "min")
+            + pd.Timedelta(hours=9, minutes=30)
+        )
+        prices = pd.DataFrame(
+            100 * np.exp(np.cumsum(
+                rng.normal(0, 0.001, (len(dates), 3)), axis=0)),
+            columns=["aaa", "bbb", "ccc"],
+        )
+        prices.insert(0, "date", dates)
+        portfolio = {"aaa": 0.5, "bbb": 0.3, "ccc": 0.2}
+        date_start = datetime.date(2023, 1, 2)
+        date_end = datetime.date(2023, 3, 31)
+        chunks = [prices.iloc[i:i + 1000] for i in range(0, len(prices), 1000)]
+
+        # monthly rebalancing on the last bar of each month
+        drb = FixedWeightBacktester(
+            portfolio, prices, date_start, date_end, "monthly")
+        drb.calc_daily_returns()
+        drb.calc_portfolio_statistics()
+        drb_streaming = FixedWeightBacktester(
+            portfolio, None, date_start, date_end, "monthly")
+        drb_streaming.calc_streaming_statistics(iter(chunks))
+        columns = ["cumulative_return", "volatility", "sharpe_ratio",
+                   "skew", "kurtosis", "drawdown_max"]
+        assert np.allclose(
+            drb_streaming.statistics[columns],
+            drb.statistics[columns],
+            rtol=1e-9,
+            atol=1e-12,
+        )
+
+        # daily rebalancing on every bar, as in the in-memory backtest
+        drb = FixedWeightBacktester(
+            portfolio, prices, date_start, date_end, "daily")
+        drb.calc_daily_returns()
+        drb.calc_portfolio_statistics()
+        drb_streaming = FixedWeightBacktester(
+            portfolio, None, date_start, date_end, "daily")
+        drb_streaming.calc_streaming_statistics(iter(chunks))
+        assert np.allclose(
+            drb_streaming.statistics[columns],
+            drb.statistics[columns],
+            rtol=1e-9,
+            atol=1e-12,
+        )
+
+    def test_streaming_empty_window(self, price_test_data):
+        drb = FixedWeightBacktester(
+            {"spy": 1.0},
+            None,
+            datetime.date(1990, 1, 2),
+            datetime.date(1990, 12, 31),
+            "monthly")
+        with pytest.raises(ValueError, match="no prices in backtest window"):
+            drb.calc_streaming_statistics(iter([price_test_data]))
+
+
+class TesterMultiMarketCorrections:
+    def test_episodes_match_single_asset_loop(self, price_test_data):
+        mmc = MultiMarketCorrections(
+            price_test_data,
+            [-0.05, -0.1],
+            ["spy", "tlt"],
+        )
+        assert set(mmc.corrections["asset"]) == {"spy", "tlt"}
+        assert set(mmc.corrections["threshold"]) == {-0.05, -0.1}
+
+        # recomputing the spy episodes the way MarketCorrections does
+        df = price_test_data[["date", "spy"]].copy()
+        df["equity"] = (1 + df["spy"].pct_change().fillna(0)).cumprod()
+        df["drawdown"] = (df["equity"] / df["equity"].cummax()) - 1
+        dates_high = df.query("drawdown == 0")["date"]
+        for date_start, date_end in zip(dates_high[:-1], dates_high[1:]):
+            df_period = df.query("@date_start <= date & date <= @date_end")
+            drawdown = df_period["drawdown"].min()
+            if drawdown >= -0.1:
+                continue
+            row = mmc.corrections.query(
+                "asset == 'spy' & threshold == -0.1 & start == @date_start"
+            )
+            assert len(row) == 1
+            assert row["end"].iloc[0] == date_end
+            assert row["drawdown"].iloc[0] == drawdown
+            assert row["bottom"].iloc[0] == \
+                df_period.query("drawdown == @drawdown")["date"].iloc[0]
+
+    def test_supplied_prices_match_single_asset(self, price_test_data):
+        mc = MarketCorrections("SPY", -0.1, price_test_data)
+        mmc = MultiMarketCorrections(price_test_data, [-0.1], ["spy"])
+        assert np.array_equal(
+            mc.corrections["drawdown_spy"], mmc.corrections["drawdown"]
+        )
+        assert (mc.corrections["bottom"] == mmc.corrections["bottom"]).all()
+
+    def test_period_drawdowns_batched(self, price_test_data):
+        mmc = MultiMarketCorrections(
+            price_test_data,
+            [-0.05, -0.1, -0.2],
+            ["spy", "gld"],
+        )
+        portfolio = {
+            "spy": 0.6,
+            "agg": 0.4,
+        }
+        date_start = datetime.date(2007, 4, 11)
+        date_end = datetime.date(2024, 12, 31)
+        drb = FixedWeightBacktester(
+            portfolio,
+            price_test_data,
+            date_start,
+            date_end,
+            None,
+            mmc.corrections)
+        drb.calc_daily_returns()
+        drb.calc_period_drawdowns()
+
+        assert len(drb.market_corrections) > 0
+        for ix in drb.market_corrections.index:
+            expected = period_max_drawdown(
+                asset="portfolio",
+                date_start=drb.market_corrections.at[ix, "start"],
+                date_end=drb.market_corrections.at[ix, "end"],
+                df_ret=drb.returns,
+            )
+            assert np.isclose(
+                drb.market_corrections.at[ix, "drawdown_portfolio"],
+                expected,
+                rtol=0,
+                atol=1e-12,
+            )
+
+
+class TesterBacktestExporter:
+    @pytest.fixture
+    def backtests(self, price_test_data) -> dict:
+        mmc = MultiMarketCorrections(price_test_data, [-0.1], ["spy"])
+        backtests = {}
+        for name, frequency in [("monthly", "monthly"), ("daily", None)]:
+            drb = FixedWeightBacktester(
+                {"spy": 0.6, "agg": 0.4},
+                price_test_data,
+                datetime.date(2015, 1, 2),
+                datetime.date(2024, 12, 31),
+                frequency,
+                mmc.corrections)
+            drb.calc_daily_returns()
+            drb.calc_portfolio_statistics()
+            drb.calc_period_drawdowns()
+            backtests[name] = drb
+        return backtests
+
+    def test_to_excel(self, backtests, tmp_path):
+        pytest.importorskip("xlsxwriter")
+        path = tmp_path / "backtests.xlsx"
+        exporter = BacktestExporter(backtests)
+        # a small chunk size so that rows are written across many chunks
+        exporter.excel_chunksize = 97
+        exporter.to_excel(str(path))
+
+        sheets = pd.read_excel(path, sheet_name=None)
+        assert list(sheets) == [
+            "statistics", "annual_performance", "market_corrections",
+            "returns_monthly", "returns_daily",
+        ]
+        df_statistics = sheets["statistics"].set_index(["backtest", "asset"])
+        assert np.isclose(
+            df_statistics.at[("monthly", "portfolio"), "sharpe_ratio"],
+            backtests["monthly"].statistics.at["portfolio", "sharpe_ratio"],
+        )
+        assert len(sheets["market_corrections"]) == \
+            2 * len(backtests["daily"].market_corrections)
+        df_returns = sheets["returns_monthly"]
+        assert len(df_returns) == len(backtests["monthly"].returns)
+        assert np.allclose(
+            df_returns["equity_portfolio"],
+            backtests["monthly"].returns["equity_portfolio"],
+        )
+
+    def test_to_parquet_and_csv(self, backtests, tmp_path):
+        pytest.importorskip("pyarrow")
+        exporter = BacktestExporter(backtests)
+        exporter.to_parquet(str(tmp_path / "parquet"))
+        exporter.to_csv(str(tmp_path / "csv"))
+
+        df_parquet = pd.read_parquet(
+            tmp_path / "parquet" / "statistics.parquet"
+        )
+        df_csv = pd.read_csv(tmp_path / "csv" / "statistics.csv")
+        assert len(df_parquet) == len(df_csv) == 6
+        assert np.allclose(
+            df_parquet["annual_return"], df_csv["annual_return"]
+        )
+        df_returns = pd.read_parquet(
+            tmp_path / "parquet" / "returns_daily.parquet"
+        )
+        assert np.allclose(
+            df_returns["equity_portfolio"],
+            backtests["daily"].returns["equity_portfolio"],
+        )
+
+
+class TesterImports:
+    # seconds allowed to import the library modules once pandas and numpy
+    # are loaded, which every caller pays for anyway
+    import_time_budget = 0.25
+
+    # optional dependencies that must only be imported when they are used
+    lazy_dependencies = ["yfinance", "xlsxwriter", "pyarrow", "openpyxl"]
+
+    def _run(self, code: str) -> list[str]:
+        result = subprocess.run(
+            [sys.executable, "-c", "import sys, time\n" + code],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        return result.stdout.splitlines()
+
+    def _loaded(self) -> str:
+        return (
+            f"lazy = {self.lazy_dependencies!r}\n"
+            "print(','.join(x for x in lazy if x in sys.modules))\n"
+        )
+
+    def test_import_time_and_lazy_dependencies(self):
+        # pandas may import some of these itself (pandas 3 loads pyarrow),
+        # and those cannot be held against the library modules
+        (loaded_by_pandas,) = self._run(
+            "import numpy, pandas\n" + self._loaded()
+        )
+        import_time, loaded = self._run(
+            "import numpy, pandas\n"
+            "time_start = time.perf_counter()\n"
+            "import yf_backtest, PriceFetcher, MarketCorrections\n"
+            "print(time.perf_counter() - time_start)\n" + self._loaded()
+        )
+        assert float(import_time) < self.import_time_budget
+        loaded_by_library = \
+            set(loaded.split(",")) - set(loaded_by_pandas.split(","))
+        assert loaded_by_library <= {""}
+
+
+class TesterBatchRunner:
+    def test_run_and_resume(self, tmp_path):
+        output = tmp_path / "results"
+        spec = {
+            "prices": {
+                "path": "data/bufr_bufd_mquslblr.xlsx",
+                "rename": {
+                    "mqu1pplr": "buffer_100",
+                    "mquslblr": "buffer_020",
+                    "mqu1bslq": "buffer_010",
+                },
+            },
+            "portfolios": {
+                "spy50_hyg50": {"spy": 0.5, "hyg": 0.5},
+                "growth_model_4": {
+                    "spy": 0.7,
+                    "tlt": 0.15,
+                    "gld": 0.05,
+                    "buffer_020": 0.05,
+                    "buffer_100": 0.05,
+                },
+            },
+            "windows": [{"start": "2020-12-31", "end": "2024-12-31"}],
+            "frequencies": ["quarterly", None],
+            "corrections": {"assets": ["spy"], "thresholds": [-0.1]},
+            "output": str(output),
+        }
+        path_spec = tmp_path / "spec.json"
+        path_spec.write_text(json.dumps(spec))
+        BatchRunner.main([str(path_spec), "--processes", "2"])
+
+        df_statistics = pd.read_csv(output / "statistics.csv")
+        assert len(df_statistics) == 2 * 3 + 2 * 6
+        sharpe = df_statistics.query(
+            "portfolio == 'growth_model_4' & frequency == 'quarterly' "
+            "& asset == 'portfolio'"
+        )["sharpe_ratio"].iloc[0]
+        assert np.round(sharpe, 7) == np.round(0.732673101132687, 7)
+        df_corrections = pd.read_csv(output / "market_corrections.csv")
+        assert set(df_corrections["job_id"]) == set(df_statistics["job_id"])
+
+        # an interrupted run leaves a partly written checkpoint behind
+        path_checkpoint = output / "checkpoint.jsonl"
+        lines = path_checkpoint.read_text().splitlines()
+        path_checkpoint.write_text("\n".join(lines[:2]) + "\n" + "{\"job")
+        BatchRunner.main([str(path_spec), "--processes", "2"])
+        lines_resumed = path_checkpoint.read_text().splitlines()
+        assert lines_resumed[:2] == lines[:2]
+        assert sorted(lines_resumed) == sorted(lines)
+
+    def test_failures_and_changed_weights(self, tmp_path):
+        output = tmp_path / "results"
+        spec = {
+            "prices": {"path": "data/bufr_bufd_mquslblr.xlsx"},
+            "portfolios": {
+                "spy_agg": {"spy": 0.5, "agg": 0.5},
+                "missing": {"spy": 0.5, "nosuch": 0.5},
+            },
+            "windows": [{"start": "2022-12-30", "end": "2024-12-31"}],
+            "frequencies": ["monthly"],
+            "output": str(output),
+        }
+        path_spec = tmp_path / "spec.json"
+        path_spec.write_text(json.dumps(spec))
+        with pytest.raises(SystemExit) as exit_info:
+            BatchRunner.main([str(path_spec), "--processes", "2"])
+        assert exit_info.value.code == 1
+
+        # the failing job is reported and the other job still finishes
+        df_failures = pd.read_csv(output / "failures.csv")
+        assert len(df_failures) == 1
+        assert df_failures["job_id"].iloc[0].startswith("missing|")
+        assert "nosuch" in df_failures["error"].iloc[0]
+        df_statistics = pd.read_csv(output / "statistics.csv")
+        assert set(df_statistics["portfolio"]) == {"spy_agg"}
+        sharpe = df_statistics.query("asset == 'portfolio'")["sharpe_ratio"]
+
+        # a resumed run tries the failed job again and reports it once
+        with pytest.raises(SystemExit) as exit_info:
+            BatchRunner.main([str(path_spec), "--processes", "2"])
+        assert exit_info.value.code == 1
+        assert len(pd.read_csv(output / "failures.csv")) == 1
+        assert len(pd.read_csv(output / "statistics.csv")) == 3
+
+        # once the prices are there the failed job finishes
+        spec["prices"]["rename"] = {"tlt": "nosuch"}
+        path_spec.write_text(json.dumps(spec))
+        BatchRunner.main([str(path_spec), "--processes", "2"])
+        assert len(pd.read_csv(output / "failures.csv")) == 0
+        df_statistics = pd.read_csv(output / "statistics.csv")
+        assert set(df_statistics["portfolio"]) == {"spy_agg", "missing"}
+        del spec["prices"]["rename"]
+
+        # new weights are a new job rather than a checkpoint hit
+        del spec["portfolios"]["missing"]
+        spec["portfolios"]["spy_agg"] = {"spy": 0.9, "agg": 0.1}
+        path_spec.write_text(json.dumps(spec))
+        BatchRunner.main([str(path_spec), "--processes", "2"])
+        df_statistics = pd.read_csv(output / "statistics.csv")
+        assert len(df_statistics) == 3
+        assert len(pd.read_csv(output / "failures.csv")) == 0
+        sharpe_new = \
+            df_statistics.query("asset == 'portfolio'")["sharpe_ratio"]
+        assert sharpe_new.iloc[0] != sharpe.iloc[0]
+
+    def test_no_job_succeeds(self, tmp_path):
+        output = tmp_path / "results"
+        spec = {
+            "prices": {"path": "data/bufr_bufd_mquslblr.xlsx"},
+            "portfolios": {"missing": {"spy": 0.5, "nosuch": 0.5}},
+            "windows": [{"start": "2022-12-30", "end": "2024-12-31"}],
+            "corrections": {"assets": ["spy"], "thresholds": [-0.1]},
+            "output": str(output),
+        }
+        path_spec = tmp_path / "spec.json"
+        path_spec.write_text(json.dumps(spec))
+        with pytest.raises(SystemExit):
+            BatchRunner.main([str(path_spec), "--processes", "1"])
+
+        # the outputs still have their headers
+        df_statistics = pd.read_csv(output / "statistics.csv")
+        assert len(df_statistics) == 0
+        assert "sharpe_ratio" in df_statistics.columns
+        df_corrections = pd.read_csv(output / "market_corrections.csv")
+        assert len(df_corrections) == 0
+        assert "drawdown_portfolio" in df_corrections.columns
+
+
+class TesterWeightOptimizer:
+    def test_evaluate_matches_backtester(self, price_test_data):
+        portfolio = {
+            "spy": 0.45,
+            "agg": 0.1,
+            "tlt": 0.2,
+            "buffer_010": 0.1,
+            "buffer_020": 0.1,
+            "buffer_100": 0.05,
+        }
+        date_start = datetime.date(2007, 4, 11)
+        date_end = datetime.date(2024, 12, 31)
+        wo = WeightOptimizer(
+            list(portfolio),
+            price_test_data,
+            date_start,
+            date_end,
+            "monthly")
+        df_statistics = wo.evaluate([
+            list(portfolio.values()),
+            [1 / 6] * 6,
+        ])
+
+        accuracy = 7
+        assert np.round(df_statistics.at[0, "sharpe_ratio"], accuracy) == \
+            np.round(0.733648500090021, accuracy)
+        assert np.round(df_statistics.at[0, "drawdown_max"], accuracy) == \
+            np.round(-0.317950340976042, accuracy)
+
+        drb = FixedWeightBacktester(
+            dict(zip(portfolio, [1 / 6] * 6)),
+            price_test_data,
+            date_start,
+            date_end,
+            "monthly")
+        drb.calc_daily_returns()
+        drb.calc_portfolio_statistics()
+        assert np.allclose(
+            df_statistics.loc[1].values,
+            drb.statistics.loc["portfolio"].values,
+            rtol=1e-9,
+        )
+
+    def test_optimize_within_bounds(self, price_test_data):
+        assets = ["spy", "agg", "hyg", "tlt", "gld", "buffer_020"]
+        bounds = {"spy": (0.2, 0.6), "gld": (0.0, 0.1)}
+        wo = WeightOptimizer(
+            assets,
+            price_test_data,
+            datetime.date(2010, 1, 4),
+            datetime.date(2024, 12, 31),
+            "quarterly",
+            bounds)
+        wo.optimize("sharpe_ratio", n_candidates=200, n_iterations=5, seed=0)
+
+        weights = np.array(list(wo.weights_optimal.values()))
+        assert np.isclose(weights.sum(), 1)
+        assert 0.2 - 1e-9 <= wo.weights_optimal["spy"] <= 0.6 + 1e-9
+        assert wo.weights_optimal["gld"] <= 0.1 + 1e-9
+        assert (weights >= -1e-9).all()
+        sharpe_equal = wo.evaluate(
+            wo._project(np.full((1, len(assets)), 1 / len(assets)))
+        ).at[0, "sharpe_ratio"]
+        assert wo.statistics_optimal["sharpe_ratio"] >= sharpe_equal
+
+        # the frontier trades volatility for strictly higher returns
+        assert len(wo.frontier) > 0
+        assert wo.frontier["volatility"].is_monotonic_increasing
+        assert wo.frontier["annual_return"].is_monotonic_increasing
+
+        # a second search is warm-started from the first one
+        sharpe_first = wo.statistics_optimal["sharpe_ratio"]
+        wo.optimize("sharpe_ratio", n_candidates=50, n_iterations=1, seed=1)
+        assert wo.statistics_optimal["sharpe_ratio"] >= sharpe_first - 1e-9
+
+    def test_frontier_spans_universe(self, price_test_data):
+        assets = ["spy", "agg", "tlt", "gld", "buffer_100"]
+        wo = WeightOptimizer(
+            assets,
+            price_test_data,
+            datetime.date(2010, 1, 4),
+            datetime.date(2024, 12, 31),
+            "monthly")
+        wo.optimize("sharpe_ratio", n_candidates=200, n_iterations=4,
+                    seed=0, n_frontier=8)
+
+        # the frontier runs from below the least volatile asset up to the
+        # asset with the highest return
+        df_single = wo.evaluate(np.eye(len(assets)))
+        ix_high = df_single["annual_return"].idxmax()
+        assert wo.frontier["volatility"].min() <= \
+            df_single["volatility"].min()
+        assert np.isclose(
+            wo.frontier["annual_return"].max(),
+            df_single.at[ix_high, "annual_return"],
+        )
+        assert np.isclose(
+            wo.frontier["volatility"].max(),
+            df_single.at[ix_high, "volatility"],
+        )
+
+    def test_missing_prices_dropped(self, price_test_data):
+        df_prices = price_test_data.copy()
+        df_prices.loc[df_prices["date"] == "2015-06-01", "spy"] = np.nan
+        wo = WeightOptimizer(
+            ["spy", "agg"],
+            df_prices,
+            datetime.date(2015, 1, 2),
+            datetime.date(2015, 12, 31),
+            "monthly")
+        wo.optimize(n_candidates=50, n_iterations=1, seed=0, n_frontier=3)
+        assert np.isfinite(wo.statistics_optimal["sharpe_ratio"])
+
+        with pytest.raises(ValueError, match="not enough complete prices"):
+            WeightOptimizer(
+                ["spy", "agg"],
+                df_prices,
+                datetime.date(1990, 1, 2),
+                datetime.date(1990, 12, 31),
+                "monthly")
+
+    def test_invalid_weights_and_bounds(self, price_test_data):
+        args = (
+            ["spy", "agg"],
+            price_test_data,
+            datetime.date(2015, 1, 2),
+            datetime.date(2015, 12, 31),
+            "monthly",
+        )
+        wo = WeightOptimizer(*args)
+        with pytest.raises(ValueError, match="sum to 1"):
+            wo.evaluate([[0.5, 0.5], [1.0, 1.0]])
+        with pytest.raises(ValueError, match="one column per asset"):
+            wo.evaluate([1.0])
+        with pytest.raises(ValueError, match="above upper bound"):
+            WeightOptimizer(*args, bounds={"spy": (0.6, 0.4)})
+        with pytest.raises(ValueError, match="not in universe"):
+            WeightOptimizer(*args, bounds={"tlt": (0.0, 0.5)})
@@ -0,0 +1,21 @@
+"""
+Lightweight entry point to the backtester.  Exposes the backtesting,
+correction analysis, export and weight optimization classes that work
+on prices that have already been fetched, without loading yfinance or
+its network stack.
+Use PriceFetcher or MarketCorrections directly to download prices.
+"""
+from FixedWieightBacktester import FixedWeightBacktester
+from MarketCorrections import MultiMarketCorrections
+from BacktestExporter import BacktestExporter
+from WeightOptimizer import WeightOptimizer
+from Utilities import calc_statistics, drawdown_episodes
+
+__all__ = [
+    "FixedWeightBacktester",
+    "MultiMarketCorrections",
+    "BacktestExporter",
+    "WeightOptimizer",
+    "calc_statistics",
+    "drawdown_episodes",
+]